@@ -1,11 +1,18 @@
+from __future__ import annotations
+
 import os
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.prompt import Prompt, Confirm
 from rich.panel import Panel
-from repo_parser import RepoParser
-from vector_store import VectorStoreManager
-from qa_assistant import CodebaseQA
+
+# The embedding and LLM stack is imported inside main(): splitter worker processes
+# re-import this module as __mp_main__ and must not pay for it
+if TYPE_CHECKING:
+    from repo_parser import RepoParser
+    from vector_store import VectorStoreManager
+    from qa_assistant import CodebaseQA
 
 console = Console()
 
@@ -36,6 +43,10 @@ def main():
         return
     
     display_banner()
+    from repo_parser import RepoParser
+    from vector_store import VectorStoreManager
+    from qa_assistant import CodebaseQA
+    
     repo_parser = RepoParser(github_token=github_token)
     vector_store_manager = VectorStoreManager()
     qa_assistant = CodebaseQA(vector_store_manager, groq_api_key)
@@ -71,10 +82,6 @@ def index_new_repository(repo_parser: RepoParser, vector_store_manager: VectorSt
         repo_path = repo_parser.clone_repo(repo_url)
         
         documents = repo_parser.parse_repo(repo_path)
-        
-        if not documents:
-            console.print("[red]No valid documents found in repository[/red]")
-            return
         repo_info = repo_parser.get_repo_info(repo_url)
         
         repo_name = repo_url.rstrip('/').split('/')[-1].replace('.git', '')
@@ -123,8 +130,9 @@ def chat_with_repository(vector_store_manager: VectorStoreManager, qa_assistant:
                 continue
             
             console.print("\n[dim]Thinking...[/dim]")
-            result = qa_assistant.ask(question)
-            qa_assistant.display_answer(result)
+            console.print("\n[bold cyan]Answer:[/bold cyan]")
+            result = qa_assistant.ask(question, stream=True)
+            qa_assistant.display_sources(result)
     
     except Exception as e:
         console.print(f"[red]Error: {str(e)}[/red]")
@@ -1,25 +1,101 @@
-from typing import List
+import asyncio
+from typing import Any, List, Tuple
 from langchain_groq import ChatGroq
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain.chains import ConversationalRetrievalChain, LLMChain
+from langchain.chains.combine_documents.base import BaseCombineDocumentsChain
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.memory import ConversationSummaryBufferMemory
 from langchain.prompts import PromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler, Callbacks
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 
 console = Console()
 
 
+class LiveMarkdownHandler(BaseCallbackHandler):
+    """Collects streamed LLM tokens while attached and renders them as Markdown inside a rich Live display"""
+    
+    def __init__(self):
+        self.live = None
+        self.tokens = []
+        self._rendered = (0, Markdown(""))
+    
+    def attach(self, live: Live):
+        self.live = live
+        self.tokens = []
+        self._rendered = (0, Markdown(""))
+    
+    def detach(self):
+        self.live = None
+        self.tokens = []
+        self._rendered = (0, Markdown(""))
+    
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self.live is not None:
+            self.tokens.append(token)
+    
+    def __rich__(self) -> Markdown:
+        # Called by Live once per refresh, so the answer is parsed at the refresh rate rather than per token
+        if self._rendered[0] != len(self.tokens):
+            self._rendered = (len(self.tokens), Markdown("".join(self.tokens)))
+        return self._rendered[1]
+
+
+class FormatMapStuffChain(BaseCombineDocumentsChain):
+    """Stuffs retrieved documents into a fixed prompt string with a single str.format_map call"""
+    
+    llm: BaseLanguageModel
+    template: str
+    document_separator: str = "\n\n"
+    
+    @property
+    def _chain_type(self) -> str:
+        return "format_map_stuff"
+    
+    def _format_prompt(self, docs: List[Document], question: str, chat_history: str = "", **kwargs: Any) -> str:
+        return self.template.format_map({
+            "context": self.document_separator.join(doc.page_content for doc in docs),
+            "chat_history": chat_history,
+            "question": question
+        })
+    
+    def combine_docs(self, docs: List[Document], callbacks: Callbacks = None, **kwargs: Any) -> Tuple[str, dict]:
+        message = self.llm.invoke(self._format_prompt(docs, **kwargs), config={"callbacks": callbacks})
+        return message.content, {}
+    
+    async def acombine_docs(self, docs: List[Document], callbacks: Callbacks = None, **kwargs: Any) -> Tuple[str, dict]:
+        message = await self.llm.ainvoke(self._format_prompt(docs, **kwargs), config={"callbacks": callbacks})
+        return message.content, {}
+
+
 class CodebaseQA:
     def __init__(self, vector_store_manager, groq_api_key: str):
         self.vector_store_manager = vector_store_manager
         console.print("[blue]Initializing Groq LLM...[/blue]")
+        self.stream_handler = LiveMarkdownHandler()
         self.llm = ChatGroq(
+            groq_api_key=groq_api_key,
+            model_name="llama-3.3-70b-versatile",
+            temperature=0.2,
+            max_tokens=2048,
+            streaming=True,
+            callbacks=[self.stream_handler]
+        )
+        # Rephrasing follow-ups and summarizing history are never shown, so they run on a client without the stream handler
+        self.condense_llm = ChatGroq(
             groq_api_key=groq_api_key,
             model_name="llama-3.3-70b-versatile",
             temperature=0.2,
             max_tokens=2048
         )
-        self.memory = ConversationBufferMemory(
+        # Older turns are folded into a running summary so the prompt stays bounded as the chat grows
+        self.memory = ConversationSummaryBufferMemory(
+            llm=self.condense_llm,
+            max_token_limit=1500,
             memory_key="chat_history",
             return_messages=True,
             output_key="answer"
@@ -51,6 +127,9 @@ Answer:"""
         )
         
         self.qa_chain = None
+        self.batch_chain = None
+        self._repo_info_prefix = ""
+        self._repo_info_version = None
         console.print("[green]✓ QA Assistant initialized[/green]")
     
     def setup_chain(self):
@@ -62,30 +141,81 @@ Answer:"""
             search_kwargs={"k": 6}
         )
 
-        self.qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
+        self.qa_chain = self._build_chain(retriever, memory=self.memory)
+        # Same pipeline without memory, so concurrent questions don't interleave in the chat history
+        self.batch_chain = self._build_chain(retriever)
+        
+        self._refresh_repo_info_prefix()
+        console.print("[green]✓ QA Chain configured[/green]")
+    
+    def _build_chain(self, retriever, memory=None) -> ConversationalRetrievalChain:
+        # The answer prompt is fixed, so it is filled with format_map rather than a PromptTemplate per call
+        return ConversationalRetrievalChain(
             retriever=retriever,
-            memory=self.memory,
+            combine_docs_chain=FormatMapStuffChain(llm=self.llm, template=self.prompt_template),
+            question_generator=LLMChain(llm=self.condense_llm, prompt=CONDENSE_QUESTION_PROMPT),
+            memory=memory,
             return_source_documents=True,
-            verbose=False,
-            combine_docs_chain_kwargs={"prompt": self.PROMPT}
+            verbose=False
         )
+    
+    def ask(self, question: str, stream: bool = False) -> dict:
+        """Ask a question about the codebase, optionally rendering the answer live as it streams in"""
+        question_with_repo = self._prepare_question(question)
+        if stream:
+            # Overflow stays at the default ellipsis while streaming; Live.stop renders the final answer in full
+            with Live(self.stream_handler, console=console, refresh_per_second=12) as live:
+                self.stream_handler.attach(live)
+                try:
+                    result = self.qa_chain({"question": question_with_repo})
+                    live.update(Markdown(result["answer"]))
+                finally:
+                    self.stream_handler.detach()
+        else:
+            result = self.qa_chain({"question": question_with_repo})
+        return self._format_result(result)
+    
+    async def aask(self, question: str, use_memory: bool = True) -> dict:
+        """Ask a question asynchronously; without memory the question is answered independently of the chat"""
+        question_with_repo = self._prepare_question(question)
+        if use_memory:
+            result = await self.qa_chain.ainvoke({"question": question_with_repo})
+        else:
+            result = await self.batch_chain.ainvoke({"question": question_with_repo, "chat_history": []})
+        return self._format_result(result)
+    
+    def ask_many(self, questions: List[str], max_concurrency: int = 8) -> List[dict]:
+        """Answer independent questions concurrently, capped to stay within Groq rate limits"""
+        async def run():
+            semaphore = asyncio.Semaphore(max_concurrency)
+            
+            async def bounded(question: str) -> dict:
+                async with semaphore:
+                    return await self.aask(question, use_memory=False)
+            
+            return await asyncio.gather(*[bounded(q) for q in questions])
         
-        console.print("[green]✓ QA Chain configured[/green]")
+        return asyncio.run(run())
     
-    def ask(self, question: str) -> dict:
-        """Ask a question about the codebase"""
+    def _prepare_question(self, question: str) -> str:
         if not self.qa_chain:
             self.setup_chain()
-        repo_info = self._format_repo_info()
-        question_with_repo = f"Repository Information:\n{repo_info}\n\n{question}"
-        result = self.qa_chain({"question": question_with_repo})
+        if self._repo_info_version != self.vector_store_manager.metadata_version:
+            self._refresh_repo_info_prefix()
+        return self._repo_info_prefix + question
+    
+    def _format_result(self, result: dict) -> dict:
         return {
             "answer": result["answer"],
             "source_documents": result["source_documents"],
             "chat_history": result.get("chat_history", [])
         }
     
+    def _refresh_repo_info_prefix(self):
+        """Cache the repository header prepended to every question"""
+        self._repo_info_prefix = f"Repository Information:\n{self._format_repo_info()}\n\n"
+        self._repo_info_version = self.vector_store_manager.metadata_version
+    
     def _format_repo_info(self) -> str:
         metadata = self.vector_store_manager.repo_metadata
         repo_info = metadata.get('repo_info', {})
@@ -102,7 +232,10 @@ Answer:"""
         """Display answer with rich formatting"""
         console.print("\n[bold cyan]Answer:[/bold cyan]")
         console.print(Markdown(result["answer"]))
-        
+        self.display_sources(result)
+    
+    def display_sources(self, result: dict):
+        """Display the source files an answer was drawn from"""
         console.print("\n[bold yellow]📄 Source Files:[/bold yellow]")
         seen_files = set()
         for doc in result["source_documents"]:
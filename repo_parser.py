@@ -1,13 +1,32 @@
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterator, Optional
 from git import Repo
 from github import Github
 from rich.console import Console
 from rich.progress import track
 
 console = Console()
+
+# Bytes that commonly appear in text files, as used by file(1)
+TEXTCHARS = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+SNIFF_BYTES = 8192
+# Larger files are almost always generated or data dumps rather than hand-written code
+MAX_FILE_BYTES = 512 * 1024
+
+
+def is_binary(head: bytes) -> bool:
+    """Guess whether a file is binary from its first few KB"""
+    if not head:
+        return False
+    if b'\x00' in head:
+        return True
+    return len(head.translate(None, TEXTCHARS)) / len(head) > 0.3
+
+
 class RepoParser:
     """Handles cloning and parsing GitHub repositories"""
     
@@ -25,6 +44,10 @@ class RepoParser:
             'node_modules', '.git', '__pycache__', 'venv', 'env',
             '.venv', 'dist', 'build', '.next', 'target', 'vendor'
         }
+        
+        # Lockfiles, bundles and generated code add noise to retrieval without explaining anything
+        self.skip_names = {'package-lock.json', 'yarn.lock', 'poetry.lock', 'Cargo.lock', 'go.sum'}
+        self.skip_suffixes = ('.min.js', '.min.css', '.map', '.lock', '.pb.go')
     
     def clone_repo(self, repo_url: str, local_path: str = "./repos") -> str:
         """Clone a GitHub repository locally"""
@@ -36,7 +59,14 @@ class RepoParser:
                 shutil.rmtree(clone_path)
                 
             console.print(f"[blue]Cloning repository: {repo_url}[/blue]")
-            Repo.clone_from(repo_url, clone_path)
+            # Only HEAD is needed for Q&A, so skip history and other branches;
+            # never prompt for credentials, so auth failures fail fast instead of hanging
+            Repo.clone_from(
+                repo_url,
+                clone_path,
+                multi_options=['--depth=1', '--filter=blob:none', '--single-branch'],
+                env={'GIT_TERMINAL_PROMPT': '0'}
+            )
             console.print(f"[green]✓ Repository cloned to {clone_path}[/green]")
             
             return str(clone_path)
@@ -45,40 +75,66 @@ class RepoParser:
             console.print(f"[red]Error cloning repository: {str(e)}[/red]")
             raise
     
-    def parse_repo(self, repo_path: str) -> List[Dict[str, str]]:
-        documents = []
+    def parse_repo(self, repo_path: str) -> Iterator[Dict[str, str]]:
+        """Lazily yield one document per readable source file"""
         repo_path = Path(repo_path)
         console.print(f"[blue]Parsing repository: {repo_path.name}[/blue]")
-        all_files = list(repo_path.rglob('*'))
+        candidates = list(self._iter_candidates(repo_path))
         
-        for file_path in track(all_files, description="Processing files..."):
-            if not file_path.is_file():
-                continue
-                
-            if any(skip_dir in file_path.parts for skip_dir in self.skip_dirs):
-                continue
-            
-            if file_path.suffix not in self.valid_extensions:
-                continue
-            
-            try:
-                content = file_path.read_text(encoding='utf-8')
-                relative_path = file_path.relative_to(repo_path)
-                
-                documents.append({
-                    'content': content,
-                    'file_path': str(relative_path),
-                    'file_name': file_path.name,
-                    'extension': file_path.suffix,
-                    'size': len(content)
-                })
-                
-            except Exception as e:
-                console.print(f"[yellow]Skipping {file_path.name}: {str(e)}[/yellow]")
-                continue
+        # File reads are I/O-bound, so threads overlap the syscalls despite the GIL
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        # Submit files in windows so at most a window's worth of contents is held ahead of the consumer
+        window = max_workers * 16
+        parsed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = (
+                doc
+                for start in range(0, len(candidates), window)
+                for doc in executor.map(self._read_one, candidates[start:start + window], repeat(repo_path))
+            )
+            for doc in track(results, total=len(candidates), description="Processing files..."):
+                if doc is not None:
+                    parsed += 1
+                    yield doc
+        
+        console.print(f"[green]✓ Parsed {parsed} files[/green]")
+    
+    def _iter_candidates(self, repo_path: Path) -> Iterator[Path]:
+        """Walk the repo, pruning skipped directories before descending into them"""
+        for dirpath, dirnames, filenames in os.walk(repo_path):
+            dirnames[:] = [d for d in dirnames if d not in self.skip_dirs]
+            for name in filenames:
+                if name in self.skip_names or name.endswith(self.skip_suffixes):
+                    continue
+                if os.path.splitext(name)[1] not in self.valid_extensions:
+                    continue
+                file_path = os.path.join(dirpath, name)
+                # Only regular files: symlinks to FIFOs or devices would block on open()
+                if os.path.isfile(file_path):
+                    yield Path(file_path)
+    
+    def _read_one(self, file_path: Path, repo_path: Path) -> Optional[Dict[str, str]]:
+        try:
+            with open(file_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size > MAX_FILE_BYTES:
+                    console.print(f"[yellow]Skipping {file_path.name}: {size // 1024} KB exceeds size limit[/yellow]")
+                    return None
+                head = f.read(SNIFF_BYTES)
+                if is_binary(head):
+                    return None
+                content = (head + f.read()).decode('utf-8', errors='strict')
+        except (OSError, UnicodeDecodeError) as e:
+            console.print(f"[yellow]Skipping {file_path.name}: {str(e)}[/yellow]")
+            return None
         
-        console.print(f"[green]✓ Parsed {len(documents)} files[/green]")
-        return documents
+        return {
+            'content': content,
+            'file_path': str(file_path.relative_to(repo_path)),
+            'file_name': file_path.name,
+            'extension': file_path.suffix,
+            'size': len(content)
+        }
     
     def get_repo_info(self, repo_url: str) -> Dict:
         """Fetch repository metadata from GitHub API"""
@@ -0,0 +1,45 @@
+# Kept free of heavy imports so splitter worker processes start quickly
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+
+# Extensions with syntax-aware separators; anything else uses the generic splitter
+LANGUAGE_BY_EXTENSION = {
+    '.py': Language.PYTHON,
+    '.js': Language.JS, '.jsx': Language.JS,
+    '.ts': Language.TS, '.tsx': Language.TS,
+    '.java': Language.JAVA,
+    '.c': Language.C, '.cpp': Language.CPP, '.h': Language.CPP,
+    '.cs': Language.CSHARP,
+    '.rb': Language.RUBY,
+    '.go': Language.GO,
+    '.rs': Language.RUST,
+    '.php': Language.PHP,
+    '.swift': Language.SWIFT,
+    '.kt': Language.KOTLIN,
+    '.scala': Language.SCALA,
+    '.md': Language.MARKDOWN,
+}
+
+
+@lru_cache(maxsize=None)
+def get_splitter(language: Optional[Language]) -> RecursiveCharacterTextSplitter:
+    if language is None:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        )
+    return RecursiveCharacterTextSplitter.from_language(
+        language=language,
+        chunk_size=1000,
+        chunk_overlap=200
+    )
+
+
+def split_doc(doc: Dict[str, str]) -> Tuple[Dict[str, str], List[str]]:
+    """Split one document into chunks; each worker process builds and caches its own splitters"""
+    splitter = get_splitter(LANGUAGE_BY_EXTENSION.get(doc['extension']))
+    meta = {key: doc[key] for key in ('file_path', 'file_name', 'extension')}
+    return meta, splitter.split_text(doc['content'])
@@ -1,39 +1,147 @@
-import pickle
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from typing import List, Dict, Iterable, Iterator, Tuple
+import faiss
+import numpy as np
+import orjson
+import torch
+from datasketch import MinHash, MinHashLSH
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
 from rich.console import Console
+from sentence_transformers import SentenceTransformer
+import text_splitting
+from text_splitting import split_doc
 
 console = Console()
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Int8 dynamically quantized export shipped in the model repo, using VNNI dot-products where available
+ONNX_QINT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Above this many chunks, HNSW graph memory dominates and IVF-PQ is used instead
+IVFPQ_MIN_VECTORS = 1_000_000
+# Upper bound on the number of vectors used to train the quantizer
+MAX_TRAIN_VECTORS = 50_000
+# SQLite's default limit on bound parameters per statement
+SQLITE_MAX_VARIABLES = 999
+# Below this much text, splitting inline is faster than starting worker processes
+PARALLEL_SPLIT_MIN_BYTES = 64 * 1024 * 1024
+
+
+class MiniLMEmbeddings(Embeddings):
+    """LangChain embeddings backed by a SentenceTransformer, using int8 ONNX Runtime on CPU"""
+    
+    def __init__(self, model_name: str = EMBEDDING_MODEL, device: str = 'cpu'):
+        self.model = None
+        if device == 'cpu':
+            try:
+                self.model = SentenceTransformer(
+                    model_name,
+                    device=device,
+                    backend="onnx",
+                    model_kwargs={"file_name": ONNX_QINT8_FILE}
+                )
+                self.backend = "onnx-qint8"
+            except Exception as e:
+                console.print(f"[yellow]ONNX backend unavailable, using PyTorch: {str(e)}[/yellow]")
+        
+        if self.model is None:
+            self.model = SentenceTransformer(model_name, device=device)
+            self.backend = "torch"
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True).tolist()
+
+
+class ChunkDeduplicator:
+    """Flags exact and near-duplicate chunks (license headers, vendored copies) before they are embedded"""
+    
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, shingle_size: int = 5):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+        self.minhashes = {}
+        self.seen_digests = set()
+    
+    def is_duplicate(self, chunk: str) -> bool:
+        # Exact copies are caught by a cheap digest lookup before any MinHash work
+        digest = hashlib.blake2b(chunk.encode(), digest_size=16).digest()
+        if digest in self.seen_digests:
+            return True
+        self.seen_digests.add(digest)
+        
+        tokens = chunk.split()
+        n = self.shingle_size
+        shingles = {' '.join(tokens[i:i + n]) for i in range(max(1, len(tokens) - n + 1))}
+        minhash = MinHash(num_perm=self.num_perm)
+        minhash.update_batch([shingle.encode() for shingle in shingles])
+        # LSH banding only yields candidates; confirm with the estimated Jaccard so lower-similarity chunks are kept
+        if any(minhash.jaccard(self.minhashes[key]) >= self.threshold for key in self.lsh.query(minhash)):
+            return True
+        
+        key = digest.hex()
+        self.lsh.insert(key, minhash)
+        self.minhashes[key] = minhash
+        return False
+
+
 class VectorStoreManager:
-    def __init__(self, persist_dir: str = "./vector_stores"):
+    def __init__(self, persist_dir: str = "./vector_stores", batch_size: int = 256, quantize: bool = True,
+                 deduplicate: bool = True):
         self.persist_dir = Path(persist_dir)
         self.persist_dir.mkdir(exist_ok=True)
-        console.print("[blue]Loading embedding model...[/blue]")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'}
-        )
-        console.print("[green]✓ Embedding model loaded[/green]")
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.batch_size = batch_size
+        self.quantize = quantize
+        self.deduplicate = deduplicate
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        console.print(f"[blue]Loading embedding model on {device}...[/blue]")
+        self.embeddings = MiniLMEmbeddings(device=device)
+        # The SentenceTransformer behind the LangChain wrapper, used directly for bulk encoding
+        self.model = self.embeddings.model
+        console.print(f"[green]✓ Embedding model loaded ({self.embeddings.backend})[/green]")
         self.vector_store = None
         self.repo_metadata = {}
+        self._gpu_resources = None
+        # Bumped whenever repo_metadata is replaced so consumers can invalidate anything derived from it
+        self.metadata_version = 0
+        # Content-addressed embedding cache shared by all repos, so unchanged chunks are never re-embedded
+        # Reranking can run on retriever executor threads, so the connection is shared under a lock
+        self.embed_cache = sqlite3.connect(self.persist_dir / "embed_cache.db", check_same_thread=False)
+        self._embed_cache_lock = threading.Lock()
+        self.embed_cache.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vec BLOB)")
     
-    def create_vector_store(self, documents: List[Dict[str, str]], repo_name: str, repo_info: Dict = None):
+    def create_vector_store(self, documents: Iterable[Dict[str, str]], repo_name: str, repo_info: Dict = None):
+        """Split, embed and index documents as they stream in, one mini-batch of chunks at a time"""
         console.print(f"[blue]Creating vector store for {repo_name}...[/blue]")
         langchain_docs = []
-        for doc in documents:
-            chunks = self.text_splitter.split_text(doc['content'])
+        pending = []
+        total_documents = 0
+        duplicate_chunks = 0
+        deduplicator = ChunkDeduplicator() if self.deduplicate else None
+        embs = np.empty((self.batch_size * 16, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        count = 0
+        for doc, chunks in self._split_documents(documents):
+            total_documents += 1
             
             for i, chunk in enumerate(chunks):
+                if deduplicator and deduplicator.is_duplicate(chunk):
+                    duplicate_chunks += 1
+                    continue
+                
                 langchain_docs.append(Document(
                     page_content=chunk,
                     metadata={
@@ -44,17 +152,161 @@ class VectorStoreManager:
                         'total_chunks': len(chunks)
                     }
                 ))
+                pending.append(chunk)
+                if len(pending) >= self.batch_size:
+                    embs, count = self._encode_into(embs, count, pending)
+                    pending = []
+        
+        if pending:
+            embs, count = self._encode_into(embs, count, pending)
+        
+        if not langchain_docs:
+            raise ValueError("No valid documents found in repository")
         
-        console.print(f"[blue]Creating embeddings for {len(langchain_docs)} chunks...[/blue]")
-        self.vector_store = FAISS.from_documents(langchain_docs, self.embeddings)
+        embs = embs[:count]
+        self.vector_store = self._wrap_index(self._build_index(embs), langchain_docs)
         self.repo_metadata = {
             'repo_name': repo_name,
-            'total_documents': len(documents),
+            'total_documents': total_documents,
             'total_chunks': len(langchain_docs),
+            'duplicate_chunks': duplicate_chunks,
             'repo_info': repo_info or {}
         }
+        self.metadata_version += 1
         
-        console.print(f"[green]✓ Vector store created with {len(langchain_docs)} chunks[/green]")
+        console.print(
+            f"[green]✓ Vector store created with {len(langchain_docs)} chunks "
+            f"({duplicate_chunks} duplicates skipped)[/green]"
+        )
+    
+    def _split_documents(self, documents: Iterable[Dict[str, str]]) -> Iterator[Tuple[Dict[str, str], List[str]]]:
+        """Split documents across CPU cores, keeping the next window in flight while the current one is embedded"""
+        workers = os.cpu_count() or 1
+        documents = iter(documents)
+        first = []
+        first_bytes = 0
+        if workers > 1:
+            for doc in documents:
+                first.append(doc)
+                first_bytes += doc['size']
+                if first_bytes >= PARALLEL_SPLIT_MIN_BYTES:
+                    break
+        # Small repos (or single-core machines) aren't worth starting a pool for
+        if first_bytes < PARALLEL_SPLIT_MIN_BYTES:
+            yield from map(split_doc, first)
+            yield from map(split_doc, documents)
+            return
+        
+        # Never fork: reader, progress and inference threads are alive at this point.
+        # Workers only need the lightweight text_splitting module, which the forkserver imports once up front
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload([text_splitting.__name__])
+        else:
+            context = multiprocessing.get_context()
+        window = workers * 8
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            in_flight = executor.map(split_doc, first, chunksize=8)
+            while in_flight is not None:
+                batch = list(islice(documents, window))
+                next_in_flight = executor.map(split_doc, batch, chunksize=8) if batch else None
+                yield from in_flight
+                in_flight = next_in_flight
+    
+    def _encode_into(self, embs: np.ndarray, count: int, texts: List[str]) -> Tuple[np.ndarray, int]:
+        """Encode a mini-batch into embs[count:], doubling the buffer when it is full"""
+        if count + len(texts) > len(embs):
+            grown = np.empty((max(2 * len(embs), count + len(texts)), embs.shape[1]), dtype=np.float32)
+            grown[:count] = embs[:count]
+            embs = grown
+        
+        embs[count:count + len(texts)] = self._embed_texts(texts)
+        return embs, count + len(texts)
+    
+    def _embed_texts(self, texts: List[str], store_misses: bool = True) -> np.ndarray:
+        """Embed texts through the on-disk cache, encoding only chunks not seen before"""
+        # The backend is mixed into the digest since int8 and fp32 models produce different vectors
+        person = self.embeddings.backend.encode()
+        keys = [hashlib.blake2b(text.encode(), digest_size=16, person=person).hexdigest() for text in texts]
+        cached = {}
+        with self._embed_cache_lock:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                rows = self.embed_cache.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE hash IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                cached.update((key, np.frombuffer(vec, dtype=np.float32)) for key, vec in rows)
+        
+        misses = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if misses:
+            vecs = self.model.encode(
+                list(misses.values()),
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            ).astype(np.float32)
+            cached.update(zip(misses, vecs))
+            if store_misses:
+                with self._embed_cache_lock:
+                    self.embed_cache.executemany(
+                        "INSERT OR IGNORE INTO embeddings (hash, vec) VALUES (?, ?)",
+                        [(key, vec.tobytes()) for key, vec in zip(misses, vecs)]
+                    )
+                    self.embed_cache.commit()
+        
+        return np.stack([cached[key] for key in keys])
+    
+    def _build_index(self, embs: np.ndarray) -> faiss.Index:
+        """Build an HNSW index; embeddings are L2-normalized so inner product is cosine similarity"""
+        embs = np.ascontiguousarray(embs, dtype=np.float32)
+        n, dim = embs.shape
+        
+        if not self.quantize:
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        elif n >= IVFPQ_MIN_VECTORS:
+            nlist = min(4096, 4 * int(np.sqrt(n)))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, 48, 8, faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = 16
+        else:
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+        
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efConstruction = 200
+            index.hnsw.efSearch = 64
+        
+        if not index.is_trained:
+            train_size = min(n, max(MAX_TRAIN_VECTORS, 64 * getattr(index, 'nlist', 0)))
+            sample = np.random.default_rng(0).choice(n, size=train_size, replace=False)
+            index.train(embs[np.sort(sample)])
+        
+        index.add(embs)
+        return index
+    
+    def _to_search_device(self, index: faiss.Index) -> faiss.Index:
+        """Move IVF indexes to the GPU when faiss was built with GPU support; HNSW has no GPU implementation"""
+        if not isinstance(index, faiss.IndexIVF) or not hasattr(faiss, 'StandardGpuResources'):
+            return index
+        if faiss.get_num_gpus() == 0:
+            return index
+        
+        if self._gpu_resources is None:
+            self._gpu_resources = faiss.StandardGpuResources()
+        console.print("[blue]Moving index to GPU...[/blue]")
+        return faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+    
+    def _wrap_index(self, index: faiss.Index, docs: List[Document]) -> FAISS:
+        """Wrap an index whose i-th vector belongs to docs[i] in a LangChain FAISS store"""
+        ids = [str(i) for i in range(len(docs))]
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=self._to_search_device(index),
+            docstore=InMemoryDocstore(dict(zip(ids, docs))),
+            index_to_docstore_id=dict(enumerate(ids)),
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
     
     def save_vector_store(self, repo_name: str):
         """Save vector store to disk"""
@@ -63,9 +315,23 @@ class VectorStoreManager:
         
         repo_dir = self.persist_dir / repo_name
         repo_dir.mkdir(exist_ok=True)
-        self.vector_store.save_local(str(repo_dir / "faiss_index"))
-        with open(repo_dir / "metadata.pkl", 'wb') as f:
-            pickle.dump(self.repo_metadata, f)
+        index = self.vector_store.index
+        if hasattr(faiss, 'GpuIndex') and isinstance(index, faiss.GpuIndex):
+            # GPU indexes can't be serialized directly, so persist a CPU copy
+            index = faiss.index_gpu_to_cpu(index)
+        faiss.write_index(index, str(repo_dir / "index.faiss"))
+        
+        docstore = self.vector_store.docstore
+        docs = [
+            docstore.search(self.vector_store.index_to_docstore_id[i])
+            for i in range(len(self.vector_store.index_to_docstore_id))
+        ]
+        (repo_dir / "docstore.json").write_bytes(orjson.dumps(
+            [{'page_content': doc.page_content, 'metadata': doc.metadata} for doc in docs]
+        ))
+        (repo_dir / "metadata.json").write_bytes(
+            orjson.dumps(self.repo_metadata, option=orjson.OPT_SERIALIZE_NUMPY)
+        )
         
         console.print(f"[green]✓ Vector store saved to {repo_dir}[/green]")
     
@@ -73,29 +339,50 @@ class VectorStoreManager:
         repo_dir = self.persist_dir / repo_name
         if not repo_dir.exists():
             raise ValueError(f"Vector store for {repo_name} not found")
+        if not (repo_dir / "metadata.json").exists():
+            raise ValueError(f"Vector store for {repo_name} uses an old format, please index it again")
         
         console.print(f"[blue]Loading vector store for {repo_name}...[/blue]")
-        try:
-            self.vector_store = FAISS.load_local(
-                str(repo_dir / "faiss_index"),
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
-        except TypeError:
-            self.vector_store = FAISS.load_local(
-                str(repo_dir / "faiss_index"),
-                self.embeddings
-            )
-        with open(repo_dir / "metadata.pkl", 'rb') as f:
-            self.repo_metadata = pickle.load(f)
+        index = faiss.read_index(str(repo_dir / "index.faiss"))
+        docs = [Document(**doc) for doc in orjson.loads((repo_dir / "docstore.json").read_bytes())]
+        self.vector_store = self._wrap_index(index, docs)
+        self.repo_metadata = orjson.loads((repo_dir / "metadata.json").read_bytes())
+        self.metadata_version += 1
         
         console.print(f"[green]✓ Vector store loaded ({self.repo_metadata['total_chunks']} chunks)[/green]")
     
-    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+    def similarity_search(self, query: str, k: int = 4, fetch_k: int = None) -> List[Document]:
+        """Search the index; with fetch_k > k, over-fetch and rerank on exact (unquantized) embeddings"""
         if not self.vector_store:
             raise ValueError("No vector store loaded")
         
-        return self.vector_store.similarity_search(query, k=k)
+        if not fetch_k or fetch_k <= k:
+            return self.vector_store.similarity_search(query, k=k)
+        
+        q = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        docs = self.vector_store.similarity_search_by_vector(q.tolist(), k=fetch_k)
+        return self._top_k(q, docs, k)
+    
+    def rerank(self, query: str, docs: List[Document], k: int = 4) -> List[Document]:
+        """Order candidate documents by cosine similarity to the query and keep the best k"""
+        q = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        return self._top_k(q, docs, k)
+    
+    def _top_k(self, q: np.ndarray, docs: List[Document], k: int) -> List[Document]:
+        if not docs:
+            return []
+        
+        # Candidate vectors come from the embedding cache and are L2-normalized, so one matmul gives all cosines.
+        # This is a query path, so chunks missing from the cache are encoded but not written back
+        candidates = self._embed_texts([doc.page_content for doc in docs], store_misses=False)
+        scores = candidates @ q
+        if k < len(docs):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(docs))
+        top = top[np.argsort(-scores[top])]
+        return [docs[i] for i in top]
     
     def list_available_stores(self) -> List[str]:
-        return [d.name for d in self.persist_dir.iterdir() if d.is_dir()]
\ No newline at end of file
+        # Stores saved in the old pickle layout have no metadata.json and can't be loaded
+        return [d.name for d in self.persist_dir.iterdir() if d.is_dir() and (d / "metadata.json").exists()]
\ No newline at end of file